@@ -0,0 +1,341 @@
+import pandas as pd
+import os
+import re
+import functools
+import logging
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import snowflake.connector
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Shared business rules, source layout, table layout and Snowflake loading
+# used by pandasetl.py, logging_pipleline.py and snowflakeetl.py.
+
+
+# --------------------------------------------------
+# BUSINESS RULES
+# --------------------------------------------------
+
+GENDER_MAP = {
+    'male': 'M',
+    'm': 'M',
+    'female': 'F',
+    'f': 'F'
+}
+
+GENDER_CODES = ['M', 'F', 'O']
+GENDER_DTYPE = pd.CategoricalDtype(GENDER_CODES)
+
+# Every DOB layout found in the sources, plus the text Excel date cells turn
+# into when they share a column with text dates; no two layouts can match the
+# same string, so the order only matters for speed
+DOB_FORMATS = ['%Y-%m-%d', '%Y/%m/%d', '%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S']
+
+# Full-string regex per DOB format, used to route each text DOB to the one
+# format it can match
+DOB_PATTERNS = {
+    dob_format: re.sub(r'%[mdHMS]', r'\\d{1,2}', re.escape(dob_format).replace('%Y', r'\d{4}'))
+    for dob_format in DOB_FORMATS
+}
+
+MIN_ELIGIBLE_AGE = 18
+
+
+# --------------------------------------------------
+# SOURCE LAYOUT
+# --------------------------------------------------
+
+CSV_PATH = "company1.csv"
+XLSX_PATH = "company2.xlsx"
+
+# Known source headers mapped to their canonical column names
+CSV_RENAME = {
+    'USER_ID': 'USER_ID',
+    'NAME': 'NAME',
+    'GENDER': 'GENDER',
+    'DOB': 'DOB',
+    'CITY': 'CITY'
+}
+
+XLSX_RENAME = {
+    'USER_ID': 'USER_ID',
+    'EMAIL': 'EMAIL',
+    'GENDER': 'GENDER',
+    'DOB': 'DOB',
+    'COUNTRY': 'COUNTRY'
+}
+
+# Source column types, shared by the pandas reader (as pyarrow dtypes) and
+# the Polars schemas in snowflakeetl.py. DOB is left untyped: Excel date
+# cells arrive as datetimes and text dates as strings, and parse_dob accepts
+# either
+CSV_TYPES = {
+    'USER_ID': 'int32',
+    'NAME': 'string',
+    'GENDER': 'string',
+    'CITY': 'string'
+}
+
+XLSX_TYPES = {
+    'USER_ID': 'int32',
+    'EMAIL': 'string',
+    'GENDER': 'string',
+    'COUNTRY': 'string'
+}
+
+CSV_DTYPES = {column: f"{col_type}[pyarrow]" for column, col_type in CSV_TYPES.items()}
+XLSX_DTYPES = {column: f"{col_type}[pyarrow]" for column, col_type in XLSX_TYPES.items()}
+
+
+# --------------------------------------------------
+# TABLE LAYOUT
+# --------------------------------------------------
+
+RAW_COLS = ['USER_ID', 'NAME', 'GENDER', 'DOB', 'CITY', 'EMAIL', 'COUNTRY', 'AGE', 'LOAD_TIMESTAMP']
+FINAL_COLS = ['USER_ID', 'NAME', 'EMAIL', 'GENDER', 'DOB', 'AGE', 'LOAD_TIMESTAMP']
+
+RAW_DDL = """
+CREATE OR REPLACE TABLE {table} (
+    USER_ID NUMBER,
+    NAME STRING,
+    GENDER STRING,
+    DOB DATE,
+    CITY STRING,
+    EMAIL STRING,
+    COUNTRY STRING,
+    AGE NUMBER,
+    LOAD_TIMESTAMP TIMESTAMP
+)
+"""
+
+FINAL_DDL = """
+CREATE OR REPLACE TABLE {table} (
+    USER_ID NUMBER,
+    NAME STRING,
+    EMAIL STRING,
+    GENDER STRING,
+    DOB DATE,
+    AGE NUMBER,
+    LOAD_TIMESTAMP TIMESTAMP
+)
+"""
+
+
+# --------------------------------------------------
+# SOURCE DATA INGESTION
+# --------------------------------------------------
+
+def read_sources(csv_path=CSV_PATH, xlsx_path=XLSX_PATH):
+    csv_df = pd.read_csv(
+        csv_path,
+        engine="pyarrow",
+        dtype_backend="pyarrow",
+        usecols=list(CSV_RENAME),
+        dtype=CSV_DTYPES
+    ).rename(columns=CSV_RENAME)
+    xlsx_df = pd.read_excel(
+        xlsx_path,
+        engine="calamine",
+        dtype_backend="pyarrow",
+        usecols=list(XLSX_RENAME),
+        dtype=XLSX_DTYPES
+    ).rename(columns=XLSX_RENAME)
+    return csv_df, xlsx_df
+
+
+# --------------------------------------------------
+# RAW LAYER
+# --------------------------------------------------
+
+def parse_dob(dob_values):
+    # Excel date columns arrive as datetimes already; anything else is parsed
+    # as text, each value only against the one format its layout matches
+    if pd.api.types.is_datetime64_any_dtype(dob_values):
+        return pd.to_datetime(dob_values)
+
+    pending_dob = dob_values.astype('string').dropna()
+    parsed_parts = [pd.Series(dtype='datetime64[us]')]
+    for dob_format, dob_pattern in DOB_PATTERNS.items():
+        if pending_dob.empty:
+            break
+        format_match = pending_dob.str.fullmatch(dob_pattern)
+        parsed_parts.append(
+            pd.to_datetime(pending_dob[format_match], format=dob_format, errors='coerce')
+        )
+        pending_dob = pending_dob[~format_match]
+
+    parsed_dob = pd.concat(parsed_parts).reindex(dob_values.index)
+    log_coerced_dob(int((dob_values.notna() & parsed_dob.isna()).sum()))
+    return parsed_dob
+
+
+def log_coerced_dob(coerced_count):
+    # Unparseable DOBs become null and silently drop out of the final layer
+    # (no AGE), so surface how many there were
+    if coerced_count:
+        logging.warning(f"DOB parsing coerced {coerced_count} unparseable value(s) to null")
+
+
+def cleanse_sources(csv_df, xlsx_df, load_timestamp):
+    cleansed_df = pd.concat([csv_df, xlsx_df], ignore_index=True)
+
+    # Missing values stay NA; each layer defaults them to 'O' itself so the
+    # final layer can first fall back to the other source
+    gender_text = cleansed_df['GENDER'].astype('string').str.strip().str.lower()
+    cleansed_df['GENDER'] = (
+        gender_text
+        .map(GENDER_MAP)
+        .fillna('O')
+        .mask(gender_text.isna())
+        .astype(GENDER_DTYPE)
+    )
+
+    # Stage DOB as a Parquet date so it matches the DATE column exactly
+    cleansed_df['DOB'] = parse_dob(cleansed_df['DOB']).astype('date32[pyarrow]')
+
+    # DOB is encoded as a YYYYMMDD integer so a single subtraction and
+    # integer divide yields completed years, birthday included.
+    processing_date = pd.Timestamp.today()
+    processing_date_key = (
+        processing_date.year * 10000
+        + processing_date.month * 100
+        + processing_date.day
+    )
+    dob_parts = cleansed_df['DOB'].dt
+    dob_key = (
+        dob_parts.year * 10000 + dob_parts.month * 100 + dob_parts.day
+    ).astype('Int32')
+    cleansed_df['AGE'] = ((processing_date_key - dob_key) // 10000).astype('Int16')
+
+    cleansed_df['LOAD_TIMESTAMP'] = load_timestamp
+    return cleansed_df
+
+
+def transform_raw(cleansed_df):
+    return cleansed_df.assign(GENDER=cleansed_df['GENDER'].fillna('O'))
+
+
+# --------------------------------------------------
+# FINAL LAYER
+# --------------------------------------------------
+
+def transform_final(cleansed_df, csv_df, xlsx_df):
+    # Users present in both sources; per column the first non-null value
+    # wins, so the CSV row takes precedence and the Excel row fills the gaps
+    # (GENDER included).
+    matched_user_mask = (
+        cleansed_df['USER_ID'].isin(csv_df['USER_ID'])
+        & cleansed_df['USER_ID'].isin(xlsx_df['USER_ID'])
+    )
+
+    # Project to the final columns before collapsing so CITY/COUNTRY never
+    # reach the groupby
+    merged_df = (
+        cleansed_df.loc[matched_user_mask, FINAL_COLS]
+        .groupby('USER_ID', as_index=False, sort=False)
+        .first()
+        .assign(GENDER=lambda df: df['GENDER'].fillna('O'))
+    )
+
+    # Under copy-on-write the boolean .loc is the only copy; reset_index()
+    # just relabels it
+    return merged_df.loc[merged_df['AGE'] > MIN_ELIGIBLE_AGE].reset_index(drop=True)
+
+
+# --------------------------------------------------
+# SNOWFLAKE CONNECTION
+# --------------------------------------------------
+
+# Cached so both loads and repeated runs in one process reuse a warmed
+# session; close_conn() releases it.
+@functools.lru_cache(maxsize=1)
+def get_conn():
+    return snowflake.connector.connect(
+        user=os.getenv("SNOWFLAKE_USER"),
+        password=os.getenv("SNOWFLAKE_PASSWORD"),
+        account=os.getenv("SNOWFLAKE_ACCOUNT"),
+        warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
+        database=os.getenv("SNOWFLAKE_DATABASE"),
+        schema=os.getenv("SNOWFLAKE_SCHEMA")
+    )
+
+
+def close_conn():
+    if get_conn.cache_info().currsize:
+        get_conn().close()
+        get_conn.cache_clear()
+
+
+# --------------------------------------------------
+# SNOWFLAKE PARQUET LOADER
+# --------------------------------------------------
+
+# Rows per staged Parquet file; ~100k rows of these columns is well under
+# 1 MB after snappy, so large frames upload as many small parts in parallel
+LOAD_CHUNK_ROWS = 100_000
+
+# PUT threads are network-bound, so never drop below 8 on small hosts;
+# Snowflake accepts PARALLEL between 1 and 99
+LOAD_PARALLEL = min(max(os.cpu_count() or 1, 8), 99)
+
+
+def load_via_parquet(conn, df, table):
+    # Concatenated Arrow-backed columns arrive as multi-chunk arrays;
+    # merge them into one buffer per column before writing row groups
+    arrow_table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+
+    # The table stage outlives a failed COPY, so every load gets its own file
+    # prefix and COPY only picks up the parts this call PUT
+    load_prefix = f"{table.lower()}_{uuid.uuid4().hex}"
+
+    with tempfile.TemporaryDirectory() as stage_dir:
+        # At least one file is written so an empty layer still loads cleanly
+        chunk_offsets = range(0, max(arrow_table.num_rows, 1), LOAD_CHUNK_ROWS)
+        for part, offset in enumerate(chunk_offsets):
+            pq.write_table(
+                arrow_table.slice(offset, LOAD_CHUNK_ROWS),
+                Path(stage_dir) / f"{load_prefix}_{part}.parquet",
+                compression="snappy"
+            )
+
+        parts_glob = f"{Path(stage_dir).as_posix()}/{load_prefix}_*.parquet"
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"PUT 'file://{parts_glob}' @%{table} "
+                f"PARALLEL={LOAD_PARALLEL} AUTO_COMPRESS=FALSE OVERWRITE=TRUE"
+            )
+            # Snowflake ignores Parquet logical types unless told otherwise;
+            # without this DOB and LOAD_TIMESTAMP arrive as raw integers
+            cursor.execute(
+                f"COPY INTO {table} "
+                "FILE_FORMAT=(TYPE=PARQUET USE_LOGICAL_TYPE=TRUE) "
+                "MATCH_BY_COLUMN_NAME=CASE_INSENSITIVE "
+                f"PATTERN='.*{load_prefix}_[0-9]+[.]parquet' "
+                "PURGE=TRUE"
+            )
+            # COPY INTO returns one row per file: (file, status, rows_parsed, rows_loaded, ...)
+            return sum(row[3] for row in cursor.fetchall())
+        except Exception:
+            # PURGE only clears parts a successful COPY loaded; drop this
+            # load's parts so a failed load leaves nothing on the stage
+            cursor.execute(f"REMOVE @%{table} PATTERN='.*{load_prefix}_.*'")
+            raise
+        finally:
+            cursor.close()
+
+
+def load_layers(conn, raw_df, raw_table, final_df, final_table):
+    # RAW and FINAL load in parallel, each on its own cursor of the shared session
+    with ThreadPoolExecutor(max_workers=2) as load_executor:
+        raw_count, final_count = load_executor.map(
+            load_via_parquet,
+            [conn, conn],
+            [raw_df, final_df],
+            [raw_table, final_table]
+        )
+    return raw_count, final_count
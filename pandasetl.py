@@ -1,149 +1,86 @@
 import pandas as pd
 import os
 from dotenv import load_dotenv
-import snowflake.connector
-from snowflake.connector.pandas_tools import write_pandas
-
-# ENVIRONMENT SETUP
-
-load_dotenv()
-pd.set_option('display.max_columns', None)
-
-
-# SOURCE DATA INGESTION
-
-
-company1_df = pd.read_csv("company1.csv")
-company2_df = pd.read_excel("company2.xlsx")
-
-company1_df.columns = company1_df.columns.str.strip().str.upper()
-company2_df.columns = company2_df.columns.str.strip().str.upper()
-
-
-# RAW LAYER TRANSFORMATIONS
-
-
-raw_user_df = pd.concat(
-    [company1_df, company2_df],
-    ignore_index=True
+from etl_core import (
+    read_sources,
+    cleanse_sources,
+    transform_raw,
+    transform_final,
+    get_conn,
+    close_conn,
+    load_layers
 )
 
-def standardize_gender_value(gender_value):
-    if pd.isna(gender_value):
-        return 'O'
-    gender_value = str(gender_value).strip().lower()
-    if gender_value in ['male', 'm']:
-        return 'M'
-    elif gender_value in ['female', 'f']:
-        return 'F'
-    return 'O'
-
-raw_user_df['GENDER'] = raw_user_df['GENDER'].apply(standardize_gender_value)
 
-raw_user_df['DOB'] = pd.to_datetime(raw_user_df['DOB'], errors='coerce')
+def run_etl(conn=None):
+    # ENVIRONMENT SETUP
 
-processing_date = pd.Timestamp.today()
+    load_dotenv()
+    pd.set_option('display.max_columns', None)
 
-raw_user_df['AGE'] = processing_date.year - raw_user_df['DOB'].dt.year
-raw_user_df['AGE'] -= (
-    (processing_date.month < raw_user_df['DOB'].dt.month) |
-    (
-        (processing_date.month == raw_user_df['DOB'].dt.month) &
-        (processing_date.day < raw_user_df['DOB'].dt.day)
-    )
-)
+    # SOURCE DATA INGESTION
 
-raw_user_df['DOB'] = raw_user_df['DOB'].dt.strftime('%d-%m-%Y')
+    company1_df, company2_df = read_sources()
 
-raw_user_df['LOAD_TIMESTAMP'] = pd.Timestamp.utcnow().tz_localize(None)
+    # RAW LAYER TRANSFORMATIONS
 
-
-# FINAL LAYER TRANSFORMATIONS
-
-
-joined_user_df = pd.merge(
-    company1_df,
-    company2_df,
-    on="USER_ID",
-    how="inner",
-    suffixes=('_SRC1', '_SRC2')
-)
-
-joined_user_df['GENDER'] = joined_user_df['GENDER_SRC1'].combine_first(
-    joined_user_df['GENDER_SRC2']
-)
-joined_user_df['GENDER'] = joined_user_df['GENDER'].apply(standardize_gender_value)
-
-joined_user_df['DOB'] = joined_user_df['DOB_SRC1'].combine_first(
-    joined_user_df['DOB_SRC2']
-)
-joined_user_df['DOB'] = pd.to_datetime(joined_user_df['DOB'], errors='coerce')
-
-joined_user_df['AGE'] = processing_date.year - joined_user_df['DOB'].dt.year
-joined_user_df['AGE'] -= (
-    (processing_date.month < joined_user_df['DOB'].dt.month) |
-    (
-        (processing_date.month == joined_user_df['DOB'].dt.month) &
-        (processing_date.day < joined_user_df['DOB'].dt.day)
+    cleansed_user_df = cleanse_sources(
+        company1_df,
+        company2_df,
+        pd.Timestamp.now('UTC').tz_localize(None)
+    )
+    raw_user_df = transform_raw(cleansed_user_df)
+
+    # FINAL LAYER TRANSFORMATIONS
+
+    final_user_df = transform_final(cleansed_user_df, company1_df, company2_df)
+
+    # SNOWFLAKE DATA LOAD
+
+    snowflake_connection = conn if conn is not None else get_conn()
+
+    snowflake_cursor = snowflake_connection.cursor()
+
+    try:
+        snowflake_cursor.execute(f"USE DATABASE {os.getenv('SNOWFLAKE_DATABASE')}")
+        snowflake_cursor.execute(f"USE SCHEMA {os.getenv('SNOWFLAKE_SCHEMA')}")
+        snowflake_cursor.execute(f"USE WAREHOUSE {os.getenv('SNOWFLAKE_WAREHOUSE')}")
+
+        # RAW_USER/FINAL_USER are appended to, not recreated; DOB is staged as
+        # a DATE, so refuse to load into tables still on the old STRING column
+        snowflake_cursor.execute(
+            "SELECT TABLE_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = CURRENT_SCHEMA() "
+            "AND TABLE_NAME IN ('RAW_USER', 'FINAL_USER') AND COLUMN_NAME = 'DOB'"
+        )
+        stale_tables = [table for table, data_type in snowflake_cursor.fetchall() if data_type != 'DATE']
+        if stale_tables:
+            raise RuntimeError(
+                f"DOB is not a DATE column in {', '.join(stale_tables)}; "
+                "run the DOB migration in README.md first"
+            )
+    finally:
+        snowflake_cursor.close()
+
+    raw_count, final_count = load_layers(
+        snowflake_connection,
+        raw_user_df,
+        "RAW_USER",
+        final_user_df,
+        "FINAL_USER"
     )
-)
-
-eligible_user_df = joined_user_df[joined_user_df['AGE'] > 18].copy()
-
-if 'NAME_SRC1' in eligible_user_df.columns:
-    eligible_user_df['NAME'] = eligible_user_df['NAME_SRC1']
-elif 'NAME_SRC2' in eligible_user_df.columns:
-    eligible_user_df['NAME'] = eligible_user_df['NAME_SRC2']
-
-eligible_user_df['DOB'] = eligible_user_df['DOB'].dt.strftime('%d-%m-%Y')
-eligible_user_df['LOAD_TIMESTAMP'] = pd.Timestamp.now()
-
-final_user_df = eligible_user_df[
-    [
-        'USER_ID',
-        'NAME',
-        'EMAIL',
-        'GENDER',
-        'DOB',
-        'AGE',
-        'LOAD_TIMESTAMP'
-    ]
-].reset_index(drop=True)
-
-
-# SNOWFLAKE DATA LOAD
-
-
-snowflake_connection = snowflake.connector.connect(
-    user=os.getenv("SNOWFLAKE_USER"),
-    password=os.getenv("SNOWFLAKE_PASSWORD"),
-    account=os.getenv("SNOWFLAKE_ACCOUNT"),
-    warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
-    database=os.getenv("SNOWFLAKE_DATABASE"),
-    schema=os.getenv("SNOWFLAKE_SCHEMA")
-)
 
-snowflake_cursor = snowflake_connection.cursor()
+    print(f"Snowflake Load Completed Successfully | RAW: {raw_count}, FINAL: {final_count}")
 
-snowflake_cursor.execute(f"USE DATABASE {os.getenv('SNOWFLAKE_DATABASE')}")
-snowflake_cursor.execute(f"USE SCHEMA {os.getenv('SNOWFLAKE_SCHEMA')}")
-snowflake_cursor.execute(f"USE WAREHOUSE {os.getenv('SNOWFLAKE_WAREHOUSE')}")
+    return raw_count, final_count
 
-write_pandas(
-    snowflake_connection,
-    raw_user_df,
-    "RAW_USER",
-    use_logical_type=True
-)
 
-write_pandas(
-    snowflake_connection,
-    final_user_df,
-    "FINAL_USER",
-    use_logical_type=True
-)
+def main():
+    try:
+        run_etl()
+    finally:
+        close_conn()
 
-print("Snowflake Load Completed Successfully")
 
-snowflake_cursor.close()
-snowflake_connection.close()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,261 +1,198 @@
-import pandas as pd
-import numpy as np
+import polars as pl
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 from dotenv import load_dotenv
-import snowflake.connector
-from snowflake.connector.pandas_tools import write_pandas
-
-
-# ENVIRONMENT
-
-load_dotenv()
-pd.set_option('display.max_columns', None)
-
-execution_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-current_processing_date = pd.Timestamp.today()
-
-# SOURCE FILES
-
-customer_csv_df = pd.read_csv("company1.csv")
-customer_excel_df = pd.read_excel("company2.xlsx")
-
-customer_csv_df.columns = customer_csv_df.columns.str.strip().str.upper()
-customer_excel_df.columns = customer_excel_df.columns.str.strip().str.upper()
-
-
-# RAW LAYER
-
-
-raw_customer_df = pd.concat(
-    [customer_csv_df, customer_excel_df],
-    ignore_index=True
+from etl_core import (
+    GENDER_MAP,
+    GENDER_CODES,
+    DOB_FORMATS,
+    MIN_ELIGIBLE_AGE,
+    CSV_PATH,
+    XLSX_PATH,
+    CSV_RENAME,
+    XLSX_RENAME,
+    CSV_TYPES,
+    XLSX_TYPES,
+    FINAL_COLS,
+    RAW_DDL,
+    FINAL_DDL,
+    log_coerced_dob,
+    get_conn,
+    close_conn,
+    load_layers
 )
 
-### Vectorized Gender Normalization 
-
-gender_map = {
-    'male': 'M',
-    'm': 'M',
-    'female': 'F',
-    'f': 'F'
+POLARS_TYPES = {
+    'int32': pl.Int32,
+    'string': pl.String
 }
 
-raw_customer_df['GENDER'] = (
-    raw_customer_df['GENDER']
-    .astype(str)
-    .str.strip()
-    .str.lower()
-    .map(gender_map)
-    .fillna('O')
-)
+CSV_SCHEMA = {column: POLARS_TYPES[col_type] for column, col_type in CSV_TYPES.items()}
+XLSX_SCHEMA = {column: POLARS_TYPES[col_type] for column, col_type in XLSX_TYPES.items()}
+
+### Reusable Column Expressions
+
+# -------- Gender Normalization --------
+
+def normalize_gender(gender):
+    # Missing values stay null; each layer defaults them to 'O' itself so the
+    # final layer can first fall back to the other source
+    return (
+        pl.when(gender.is_not_null())
+        .then(
+            gender
+            .cast(pl.String)
+            .str.strip_chars()
+            .str.to_lowercase()
+            .replace_strict(GENDER_MAP, default='O', return_dtype=pl.String)
+        )
+        .cast(pl.Enum(GENDER_CODES))
+    )
 
 # -------- DOB Conversion --------
 
-raw_customer_df['DOB'] = pd.to_datetime(
-    raw_customer_df['DOB'],
-    errors='coerce'
-)
+def parse_dob(dob):
+    dob = dob.cast(pl.String)
+    return pl.coalesce(
+        dob.str.to_date(dob_format, strict=False, cache=True)
+        for dob_format in DOB_FORMATS
+    )
 
 # -------- Age Calculation (Vectorized) --------
+# Same YYYYMMDD key arithmetic as etl_core.cleanse_sources
 
-raw_customer_df['AGE'] = (
-    current_processing_date.year - raw_customer_df['DOB'].dt.year
-)
-
-raw_customer_df['AGE'] -= (
-    (current_processing_date.month < raw_customer_df['DOB'].dt.month) |
-    (
-        (current_processing_date.month == raw_customer_df['DOB'].dt.month) &
-        (current_processing_date.day < raw_customer_df['DOB'].dt.day)
+def age_from_dob(dob, today_key):
+    dob_key = (
+        dob.dt.year().cast(pl.Int32) * 10000
+        + dob.dt.month().cast(pl.Int32) * 100
+        + dob.dt.day().cast(pl.Int32)
     )
-)
+    return ((today_key - dob_key) // 10000).cast(pl.Int16)
 
-raw_customer_df['DOB'] = raw_customer_df['DOB'].dt.strftime('%d-%m-%Y')
-raw_customer_df['LOAD_TIMESTAMP'] = execution_timestamp
-raw_customer_df = raw_customer_df.reset_index(drop=True)
 
+def run_etl(conn=None):
+    # ENVIRONMENT
 
-### FINAL LAYER PROCESSING
+    load_dotenv()
 
+    execution_timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
+    current_processing_date = datetime.today()
+    current_processing_key = (
+        current_processing_date.year * 10000
+        + current_processing_date.month * 100
+        + current_processing_date.day
+    )
 
+    # SOURCE FILES
 
-merged_customer_df = pd.merge(
-    customer_csv_df,
-    customer_excel_df,
-    on="USER_ID",
-    how="inner",
-    suffixes=('_SRC_CSV', '_SRC_XLSX')
-)
+    customer_csv_lf = (
+        pl.scan_csv(CSV_PATH, schema_overrides=CSV_SCHEMA)
+        .select(list(CSV_RENAME))
+        .rename(CSV_RENAME)
+    )
+    customer_excel_lf = (
+        pl.read_excel(
+            XLSX_PATH,
+            engine="calamine",
+            columns=list(XLSX_RENAME),
+            schema_overrides=XLSX_SCHEMA
+        )
+        .lazy()
+        .rename(XLSX_RENAME)
+        # Excel date cells may come back as Datetime; as Date they concat with
+        # the CSV's text DOBs as plain ISO strings that parse_dob reads
+        .with_columns(pl.col(pl.Datetime).cast(pl.Date))
+    )
 
-# -------- Safe Gender Resolution --------
+    # RAW LAYER
 
-gender_csv = 'GENDER_SRC_CSV' if 'GENDER_SRC_CSV' in merged_customer_df.columns else None
-gender_xlsx = 'GENDER_SRC_XLSX' if 'GENDER_SRC_XLSX' in merged_customer_df.columns else None
+    source_customer_lf = pl.concat([customer_csv_lf, customer_excel_lf], how="diagonal_relaxed")
 
-if gender_csv and gender_xlsx:
-    merged_customer_df['GENDER'] = merged_customer_df[gender_csv].combine_first(
-        merged_customer_df[gender_xlsx]
+    cleansed_customer_lf = (
+        source_customer_lf
+        .with_columns(
+            normalize_gender(pl.col('GENDER')).alias('GENDER'),
+            parse_dob(pl.col('DOB')).alias('DOB')
+        )
+        .with_columns(
+            age_from_dob(pl.col('DOB'), current_processing_key).alias('AGE'),
+            pl.lit(execution_timestamp).alias('LOAD_TIMESTAMP')
+        )
     )
-elif gender_csv:
-    merged_customer_df['GENDER'] = merged_customer_df[gender_csv]
-elif gender_xlsx:
-    merged_customer_df['GENDER'] = merged_customer_df[gender_xlsx]
-elif 'GENDER' in merged_customer_df.columns:
-    merged_customer_df['GENDER'] = merged_customer_df['GENDER']
-else:
-    merged_customer_df['GENDER'] = None
-
-merged_customer_df['GENDER'] = (
-    merged_customer_df['GENDER']
-    .astype(str)
-    .str.strip()
-    .str.lower()
-    .map(gender_map)
-    .fillna('O')
-)
 
-# -------- Safe DOB Resolution --------
+    raw_customer_lf = cleansed_customer_lf.with_columns(pl.col('GENDER').fill_null('O'))
 
-dob_csv = 'DOB_SRC_CSV' if 'DOB_SRC_CSV' in merged_customer_df.columns else None
-dob_xlsx = 'DOB_SRC_XLSX' if 'DOB_SRC_XLSX' in merged_customer_df.columns else None
+    coerced_dob_lf = source_customer_lf.select(
+        (pl.col('DOB').is_not_null() & parse_dob(pl.col('DOB')).is_null()).sum()
+    )
 
-if dob_csv and dob_xlsx:
-    merged_customer_df['DOB'] = merged_customer_df[dob_csv].combine_first(
-        merged_customer_df[dob_xlsx]
+    ### FINAL LAYER PROCESSING
+
+    # Final rows are derived from the cleansed rows for users present in both
+    # sources; per column the first non-null value wins, so the CSV row takes
+    # precedence and the Excel row fills the gaps (GENDER included).
+
+    final_customer_lf = (
+        cleansed_customer_lf
+        .join(customer_csv_lf.select('USER_ID'), on='USER_ID', how='semi', maintain_order='left')
+        .join(customer_excel_lf.select('USER_ID'), on='USER_ID', how='semi', maintain_order='left')
+        .select(FINAL_COLS)
+        .group_by('USER_ID', maintain_order=True)
+        .agg(pl.all().drop_nulls().first())
+        .with_columns(pl.col('GENDER').fill_null('O'))
+        .filter(pl.col('AGE') > MIN_ELIGIBLE_AGE)
     )
-elif dob_csv:
-    merged_customer_df['DOB'] = merged_customer_df[dob_csv]
-elif dob_xlsx:
-    merged_customer_df['DOB'] = merged_customer_df[dob_xlsx]
-elif 'DOB' in merged_customer_df.columns:
-    merged_customer_df['DOB'] = merged_customer_df['DOB']
-else:
-    merged_customer_df['DOB'] = None
-
-merged_customer_df['DOB'] = pd.to_datetime(
-    merged_customer_df['DOB'],
-    errors='coerce'
-)
 
-# -------- Age Calculation --------
+    # -------- Execute Both Layers --------
+    # Both plans share the scanned sources, so they are collected together and
+    # handed to the Snowflake loader as Arrow-backed pandas frames.
 
-merged_customer_df['AGE'] = (
-    current_processing_date.year - merged_customer_df['DOB'].dt.year
-)
-
-merged_customer_df['AGE'] -= (
-    (current_processing_date.month < merged_customer_df['DOB'].dt.month) |
-    (
-        (current_processing_date.month == merged_customer_df['DOB'].dt.month) &
-        (current_processing_date.day < merged_customer_df['DOB'].dt.day)
+    raw_customer_pl, final_customer_pl, coerced_dob_pl = pl.collect_all(
+        [raw_customer_lf, final_customer_lf, coerced_dob_lf],
+        engine="streaming"
     )
-)
 
-# -------- Eligible Customers (>18) --------
+    log_coerced_dob(coerced_dob_pl.item())
 
-eligible_customer_df = merged_customer_df[
-    merged_customer_df['AGE'] > 18
-].copy()
+    raw_customer_df = raw_customer_pl.to_pandas(use_pyarrow_extension_array=True)
+    final_customer_df = final_customer_pl.to_pandas(use_pyarrow_extension_array=True)
 
-# -------- Safe Name Resolution --------
+    # SNOWFLAKE LOADING
 
-name_csv = 'NAME_SRC_CSV' if 'NAME_SRC_CSV' in eligible_customer_df.columns else None
-name_xlsx = 'NAME_SRC_XLSX' if 'NAME_SRC_XLSX' in eligible_customer_df.columns else None
+    snowflake_conn = conn if conn is not None else get_conn()
 
-if name_csv and name_xlsx:
-    eligible_customer_df['NAME'] = eligible_customer_df[name_csv].combine_first(
-        eligible_customer_df[name_xlsx]
-    )
-elif name_csv:
-    eligible_customer_df['NAME'] = eligible_customer_df[name_csv]
-elif name_xlsx:
-    eligible_customer_df['NAME'] = eligible_customer_df[name_xlsx]
-elif 'NAME' in eligible_customer_df.columns:
-    eligible_customer_df['NAME'] = eligible_customer_df['NAME']
-else:
-    raise ValueError("NAME column not found in any source")
-
-eligible_customer_df['DOB'] = eligible_customer_df['DOB'].dt.strftime('%d-%m-%Y')
-eligible_customer_df['LOAD_TIMESTAMP'] = execution_timestamp
-
-final_customer_df = eligible_customer_df[
-    [
-        'USER_ID',
-        'NAME',
-        'EMAIL',
-        'GENDER',
-        'DOB',
-        'AGE',
-        'LOAD_TIMESTAMP'
-    ]
-].reset_index(drop=True)
-
-
-# SNOWFLAKE LOADING
-
-
-snowflake_conn = snowflake.connector.connect(
-    user=os.getenv("SNOWFLAKE_USER"),
-    password=os.getenv("SNOWFLAKE_PASSWORD"),
-    account=os.getenv("SNOWFLAKE_ACCOUNT"),
-    warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
-    database=os.getenv("SNOWFLAKE_DATABASE"),
-    schema=os.getenv("SNOWFLAKE_SCHEMA")
-)
+    snowflake_cursor = snowflake_conn.cursor()
+    snowflake_cursor.execute(f"USE WAREHOUSE {os.getenv('SNOWFLAKE_WAREHOUSE')}")
 
-snowflake_cursor = snowflake_conn.cursor()
-snowflake_cursor.execute(f"USE WAREHOUSE {os.getenv('SNOWFLAKE_WAREHOUSE')}")
-
-# -------- Create Raw Table --------
-
-snowflake_cursor.execute("""
-CREATE OR REPLACE TABLE RAW_LAYER_DT (
-    USER_ID NUMBER,
-    NAME STRING,
-    GENDER STRING,
-    DOB STRING,
-    CITY STRING,
-    EMAIL STRING,
-    COUNTRY STRING,
-    AGE NUMBER,
-    LOAD_TIMESTAMP TIMESTAMP
-)
-""")
-
-# -------- Create Final Table --------
-
-snowflake_cursor.execute("""
-CREATE OR REPLACE TABLE FNL_LAYER_DT (
-    USER_ID NUMBER,
-    NAME STRING,
-    EMAIL STRING,
-    GENDER STRING,
-    DOB STRING,
-    AGE NUMBER,
-    LOAD_TIMESTAMP TIMESTAMP
-)
-""")
+    snowflake_cursor.execute(RAW_DDL.format(table="RAW_LAYER_DT"))
+    snowflake_cursor.execute(FINAL_DDL.format(table="FNL_LAYER_DT"))
 
-# -------- Load Raw Layer --------
+    # -------- Load Raw & Final Layers (Concurrent) --------
+    # Both loads share the session, each on its own cursor; the tables above
+    # are created first.
 
-_, _, raw_row_count, _ = write_pandas(
-    snowflake_conn,
-    raw_customer_df,
-    "RAW_LAYER_DT"
-)
+    raw_row_count, final_row_count = load_layers(
+        snowflake_conn,
+        raw_customer_df,
+        "RAW_LAYER_DT",
+        final_customer_df,
+        "FNL_LAYER_DT"
+    )
 
-print(f"RAW_LAYER_DT loaded successfully: {raw_row_count} rows")
+    print(f"RAW_LAYER_DT loaded successfully: {raw_row_count} rows")
+    print(f"FNL_LAYER_DT loaded successfully: {final_row_count} rows")
 
-# -------- Load Final Layer --------
+    snowflake_cursor.close()
 
-_, _, final_row_count, _ = write_pandas(
-    snowflake_conn,
-    final_customer_df,
-    "FNL_LAYER_DT"
-)
+    return raw_row_count, final_row_count
+
+
+def main():
+    try:
+        run_etl()
+    finally:
+        close_conn()
 
-print(f"FNL_LAYER_DT loaded successfully: {final_row_count} rows")
 
-snowflake_cursor.close()
-snowflake_conn.close()
+if __name__ == "__main__":
+    main()